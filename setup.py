@@ -26,5 +26,8 @@ setuptools.setup(
         'lxml',
         'pkce',
         'shortuuid'
-    ]
+    ],
+    extras_require={
+        'speedups': ['orjson', 'selectolax'],
+    }
 )
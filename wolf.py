@@ -1,12 +1,13 @@
 import argparse
 import asyncio
+import functools
 import json
 import logging
 import sys
 import time
-from datetime import datetime, timedelta
+from collections import defaultdict, namedtuple
 from pathlib import Path
-from types import SimpleNamespace
+from types import MappingProxyType
 from urllib.parse import urlparse
 
 try:
@@ -21,6 +22,7 @@ sys.path.append(str(root))
 import wolf_comm
 
 from wolf_comm.constants import STATE, VALUE_ID
+from wolf_comm.helpers import json_dumps, json_loads, write_bytes_atomic
 from wolf_comm.models import Device
 
 def summarize_parameters(parameters: list):
@@ -46,14 +48,34 @@ def summarize_values(values: list):
     ]
 
 
+class _Lazy:
+    """Defer building a log argument until the record is actually formatted."""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __str__(self):
+        return self.func()
+
+
 def log_pretty(name: str, entries: list, serializer):
     """Log a JSON dump of entries with a title and count."""
-    payload = serializer(entries)
-    logging.debug("%s (%d entries):\n%s", name, len(entries), json.dumps(payload, indent=2))
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
+    logging.debug(
+        "%s (%d entries):\n%s",
+        name,
+        len(entries),
+        _Lazy(lambda: json.dumps(serializer(entries), indent=2)),
+    )
+
 
+_CREDS_PATH = Path(__file__).resolve().parent / "credentials.json"
 
+
+@functools.lru_cache(maxsize=1)
 def _load_credentials():
-    creds_path = Path(__file__).resolve().parent / "credentials.json"
+    creds_path = _CREDS_PATH
     if not creds_path.exists():
         raise FileNotFoundError(
             f"Missing credentials file at {creds_path}. "
@@ -70,29 +92,30 @@ def _load_credentials():
             "credentials.json must include non-empty 'username' and 'password' keys."
         )
 
-    mqtt_config = data.get("mqtt") or {}
+    mqtt_config = data.get("mqtt")
     if not isinstance(mqtt_config, dict):
         mqtt_config = {}
 
-    return {
+    return MappingProxyType({
         "username": username,
         "password": password,
-        "mqtt": {
-            "url": mqtt_config.get("url"),
-            "username": mqtt_config.get("username"),
-            "password": mqtt_config.get("password"),
-        },
-    }
+        "mqtt": MappingProxyType({
+            key: mqtt_config.get(key)
+            for key in ("url", "username", "password", "consolidated_status")
+        }),
+    })
 
+_TIME_FMT = "%d/%m/%Y %H:%M:%S"
 _SYSTEM_CONTEXT_CACHE = Path.cwd() / "system_context_cache.json"
+_SYSTEM_CONTEXT_TTL = 24 * 60 * 60
 
 
 def _load_cached_system_context():
     if not _SYSTEM_CONTEXT_CACHE.exists():
         return None
     try:
-        raw = _SYSTEM_CONTEXT_CACHE.read_text(encoding="utf-8")
-        cache = json.loads(raw)
+        with _SYSTEM_CONTEXT_CACHE.open("rb", buffering=65536) as fh:
+            cache = json.load(fh)
     except (FileNotFoundError, json.JSONDecodeError):
         return None
 
@@ -100,11 +123,11 @@ def _load_cached_system_context():
     if not expires_at:
         return None
     try:
-        expires_at_dt = datetime.fromisoformat(expires_at)
-    except ValueError:
+        expires_at = float(expires_at)
+    except (TypeError, ValueError):
         return None
 
-    if datetime.now() >= expires_at_dt:
+    if time.time() >= expires_at:
         return None
 
     return cache
@@ -112,7 +135,7 @@ def _load_cached_system_context():
 
 def _write_system_context_cache(system_list, parameters):
     data = {
-        "expires_at": (datetime.now() + timedelta(days=1)).isoformat(),
+        "expires_at": time.time() + _SYSTEM_CONTEXT_TTL,
         "systems": [
             {"id": system.id, "gateway": system.gateway, "name": system.name}
             for system in system_list
@@ -129,26 +152,39 @@ def _write_system_context_cache(system_list, parameters):
             for parameter in parameters
         ],
     }
-    _SYSTEM_CONTEXT_CACHE.write_text(json.dumps(data), encoding="utf-8")
+    write_bytes_atomic(_SYSTEM_CONTEXT_CACHE, json_dumps(data))
+
+
+_CachedParameter = namedtuple(
+    "_CachedParameter", "name parameter_id value_id bundle_id read_only parent"
+)
 
 
 def _build_cached_parameters(entries):
     return [
-        SimpleNamespace(
-            name=entry["name"],
-            parameter_id=entry["parameter_id"],
-            value_id=entry["value_id"],
-            bundle_id=entry["bundle_id"],
-            read_only=entry["read_only"],
-            parent=entry["parent"],
+        _CachedParameter(
+            entry["name"],
+            entry["parameter_id"],
+            entry["value_id"],
+            entry["bundle_id"],
+            entry["read_only"],
+            entry["parent"],
         )
         for entry in entries
     ]
 
 
+def _index_parameters(parameters, attribute):
+    """Map an attribute to its parameter, keeping the first match like a linear scan."""
+    index = {}
+    for parameter in parameters:
+        index.setdefault(getattr(parameter, attribute), parameter)
+    return index
+
+
 def _build_client():
     credentials = _load_credentials()
-    print("Connecting to Wolf")
+    logging.info("Connecting to Wolf")
     client = wolf_comm.WolfClient(credentials["username"], credentials["password"], region="de")
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
@@ -158,26 +194,30 @@ def _build_client():
 def _fetch_system_context(client, loop):
     cached = _load_cached_system_context()
     if cached:
-        print("Using cached system context")
+        logging.info("Using cached system context")
         systems = [
             Device(item["id"], item["gateway"], item["name"]) for item in cached["systems"]
         ]
         params = _build_cached_parameters(cached["parameters"])
         log_pretty("Parameter list (cached)", params, summarize_parameters)
-        return systems, params
+        return systems, params, _index_parameters(params, "value_id")
 
-    print("Fetching devices")
+    logging.info("Fetching devices")
     sl = loop.run_until_complete(client.fetch_system_list())
-    print("Fetching parameter list")
+    logging.info("Fetching parameter list")
     pl = loop.run_until_complete(client.fetch_parameters(sl[0].gateway, sl[0].id))
     log_pretty("Parameter list", pl, summarize_parameters)
     _write_system_context_cache(sl, pl)
-    return sl, pl
+    return sl, pl, _index_parameters(pl, "value_id")
 
 
-def _set_parameter(client, loop, gateway_id, system_id, parameters, name, value):
-    print(f"Setting {name} to {value}")
-    target = next((param for param in parameters if param.name == name), None)
+def _set_parameter(
+    client, loop, gateway_id, system_id, parameters, name, value, index=None
+):
+    logging.info("Setting %s to %s", name, value)
+    if index is None:
+        index = _index_parameters(parameters, "name")
+    target = index.get(name)
     if target is None:
         logging.warning("Parameter %s not found, skipping write", name)
         return
@@ -196,18 +236,29 @@ def _set_parameter(client, loop, gateway_id, system_id, parameters, name, value)
     logging.debug("Write response: %s", result)
 
 
-def _parse_set_payload(payload: str):
+def _split_set_payload(payload: bytes):
+    parts = payload.split(None, 1)
+    if len(parts) != 2:
+        raise ValueError("expected '<parameter> <value>' payload")
+    return (
+        parts[0].decode("utf-8", errors="ignore"),
+        parts[1].decode("utf-8", errors="ignore"),
+    )
+
+
+def _parse_set_payload(payload: bytes):
     payload = payload.strip()
     if not payload:
         raise ValueError("empty payload")
 
+    if payload[:1] not in (b"{", b"["):
+        return _split_set_payload(payload)
     try:
-        data = json.loads(payload)
-    except json.JSONDecodeError:
-        parts = payload.split(None, 1)
-        if len(parts) != 2:
-            raise ValueError("expected '<parameter> <value>' payload")
-        return parts[0], parts[1]
+        data = json_loads(payload)
+    except ValueError:
+        return _split_set_payload(payload)
+    if not isinstance(data, dict):
+        raise ValueError("JSON payload must be an object")
 
     name = data.get("name") or data.get("parameter") or data.get("parameter_name")
     value = data.get("value")
@@ -217,30 +268,47 @@ def _parse_set_payload(payload: str):
 
 
 def _create_mqtt_set_handler(client, loop, gateway_id, system_id, parameters):
+    name_index = _index_parameters(parameters, "name")
+
     def _on_message(_mqtt_client, _userdata, msg):
-        payload = msg.payload.decode("utf-8", errors="ignore")
         try:
-            name, value = _parse_set_payload(payload)
+            name, value = _parse_set_payload(msg.payload)
         except ValueError as exc:
-            logging.warning("Ignoring MQTT wolf/set payload: %s (%s)", exc, payload)
+            logging.warning(
+                "Ignoring MQTT wolf/set payload: %s (%s)",
+                exc,
+                msg.payload.decode("utf-8", errors="ignore"),
+            )
             return
         logging.info('MQTT wolf/set request for "%s" -> %s', name, value)
-        _set_parameter(client, loop, gateway_id, system_id, parameters, name, value)
+        _set_parameter(
+            client,
+            loop,
+            gateway_id,
+            system_id,
+            parameters,
+            name,
+            value,
+            index=name_index,
+        )
 
     return _on_message
 
 
+_DEFAULT_MQTT_PORTS = {"mqtts": 8883, "ssl": 8883, "mqtt": 1883, "tcp": 1883}
+
+
 def _parse_mqtt_url(value: str):
+    if value.startswith("//"):
+        value = "mqtt:" + value
+    elif "://" not in value:
+        value = "mqtt://" + value
     parsed = urlparse(value)
-    if not parsed.hostname:
-        parsed = urlparse(f"//{value}", scheme="mqtt")
     host = parsed.hostname
     if not host:
         raise ValueError("Invalid MQTT URL; unable to determine host")
     scheme = (parsed.scheme or "mqtt").lower()
-    port = parsed.port
-    if port is None:
-        port = 8883 if scheme in ("mqtts", "ssl") else 1883
+    port = parsed.port or _DEFAULT_MQTT_PORTS.get(scheme, 1883)
     return host, port, scheme
 
 
@@ -268,6 +336,7 @@ def _resolve_mqtt_settings(mqtt_section):
         "username": username,
         "password": password,
         "use_tls": use_tls,
+        "consolidated_status": mqtt_section.get("consolidated_status") is True,
     }
 
 
@@ -283,7 +352,8 @@ def _configure_mqtt_client(mqtt_settings):
         client.tls_set()
     client._wolf_mqtt_settings = mqtt_settings
     client._wolf_connected = False
-    client._wolf_persistent = False
+    client._wolf_loop_started = False
+    client._wolf_status_cleared = False
     return client
 
 
@@ -297,6 +367,14 @@ def _ensure_mqtt_connected(mqtt_client):
     mqtt_client._wolf_connected = True
 
 
+def _start_mqtt_loop(mqtt_client):
+    _ensure_mqtt_connected(mqtt_client)
+    if mqtt_client._wolf_loop_started:
+        return
+    mqtt_client.loop_start()
+    mqtt_client._wolf_loop_started = True
+
+
 def _start_mqtt_set_listener(
     client, loop, gateway_id, system_id, parameters, mqtt_client
 ):
@@ -305,8 +383,6 @@ def _start_mqtt_set_listener(
             "paho-mqtt is required for MQTT listening; install it with `pip install paho-mqtt`."
         )
 
-    mqtt_client._wolf_persistent = True
-
     def _on_connect(mqtt_client_obj, _userdata, _flags, rc):
         if rc != 0:
             logging.warning(
@@ -327,20 +403,19 @@ def _start_mqtt_set_listener(
     mqtt_client.on_message = _create_mqtt_set_handler(
         client, loop, gateway_id, system_id, parameters
     )
-    _ensure_mqtt_connected(mqtt_client)
-    mqtt_client.loop_start()
+    _start_mqtt_loop(mqtt_client)
     return mqtt_client
 
 
-def _build_status(parameters, values):
-    status = {"time": datetime.now().strftime("%d/%m/%Y %H:%M:%S")}
+def _build_status(param_by_vid, values):
+    by_parent = defaultdict(dict)
     for val in values:
-        par = next((x for x in parameters if x.value_id == val.value_id), None)
+        par = param_by_vid.get(val.value_id)
         if par is None:
             logging.debug("Skipping unknown value %s", val.value_id)
             continue
-        status.setdefault(par.parent, {})[par.name] = val.value
-    return status
+        by_parent[par.parent][par.name] = val.value
+    return {"time": time.strftime(_TIME_FMT), **by_parent}
 
 
 def _publish_status(status, mqtt_client):
@@ -352,29 +427,71 @@ def _publish_status(status, mqtt_client):
 
     client = mqtt_client
     _ensure_mqtt_connected(client)
+    timestamp = status["time"]
     try:
-        client.publish("wolf/status", json.dumps(status), retain = True)
+        for parent, values in status.items():
+            if parent == "time":
+                continue
+            client.publish(
+                f"wolf/status/{parent}",
+                json_dumps({"time": timestamp, **values}),
+                qos=0,
+                retain=True,
+            )
+        if client._wolf_mqtt_settings["consolidated_status"]:
+            client.publish("wolf/status", json_dumps(status), qos=0, retain=True)
+        elif not client._wolf_status_cleared:
+            # Drop the retained consolidated message left by older versions so
+            # subscribers do not keep reading a stale snapshot.
+            client.publish("wolf/status", b"", qos=0, retain=True)
+            client._wolf_status_cleared = True
     except Exception:
         logging.exception("Failed to publish Wolf status via MQTT")
-    finally:
-        if not getattr(mqtt_client, "_wolf_persistent", False):
-            client.disconnect()
 
 
-def _fetch_and_log_status(client, loop, sl, pl, mqtt_client=None):
-    print("Fetching parameters values")
-    values = loop.run_until_complete(
-        client.fetch_value(sl[0].gateway, sl[0].id, pl)
-    )
+async def _refresh_status(client, sl, pl, param_by_vid, mqtt_client=None):
+    logging.debug("Fetching parameters values")
+    values = await client.fetch_value(sl[0].gateway, sl[0].id, pl)
     log_pretty("Parameter values", values, summarize_values)
-    status = _build_status(pl, values)
-    print("Sending output to MQTT")
+    status = _build_status(param_by_vid, values)
     if mqtt_client:
+        logging.debug("Sending output to MQTT")
         _publish_status(status, mqtt_client)
-    print(status)
+        logging.debug("Status: %r", status)
+    else:
+        print(status)
     return values
 
 
+def _fetch_and_log_status(client, loop, sl, pl, param_by_vid, mqtt_client=None):
+    return loop.run_until_complete(
+        _refresh_status(client, sl, pl, param_by_vid, mqtt_client=mqtt_client)
+    )
+
+
+async def _refresh_forever(client, sl, pl, param_by_vid, mqtt_client, interval):
+    # Keeps the event loop running between refreshes so MQTT-triggered writes
+    # are scheduled onto it instead of driving it from the paho thread.
+    next_deadline = time.monotonic() + interval
+    while True:
+        try:
+            await _refresh_status(
+                client, sl, pl, param_by_vid, mqtt_client=mqtt_client
+            )
+        except Exception:
+            logging.exception("Failed to refresh status; retrying after sleep")
+        if interval <= 0:
+            break
+        now = time.monotonic()
+        while next_deadline <= now:
+            # A refresh overran whole intervals; skip them rather than bursting.
+            next_deadline += interval
+        sleep_for = next_deadline - now
+        logging.debug("Sleeping for %.1f seconds before next refresh", sleep_for)
+        await asyncio.sleep(sleep_for)
+        next_deadline += interval
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -396,8 +513,11 @@ def main():
     )
 
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    # httpx logs every request at INFO, which would flood interval mode
+    logging.getLogger("httpx").setLevel(logging.WARNING)
     client, loop, credentials = _build_client()
-    sl, pl = _fetch_system_context(client, loop)
+    sl, pl, param_by_vid = _fetch_system_context(client, loop)
     if args.set:
         name, value = args.set
         _set_parameter(client, loop, sl[0].gateway, sl[0].id, pl, name, value)
@@ -414,11 +534,14 @@ def main():
     system_id = sl[0].id
     try:
         if interval is None:
+            if mqtt_client is not None:
+                _start_mqtt_loop(mqtt_client)
             _fetch_and_log_status(
                 client,
                 loop,
                 sl,
                 pl,
+                param_by_vid,
                 mqtt_client=mqtt_client,
             )
         else:
@@ -430,27 +553,22 @@ def main():
                 pl,
                 mqtt_client,
             )
-            while True:
-                try:
-                    _fetch_and_log_status(
-                        client,
-                        loop,
-                        sl,
-                        pl,
-                        mqtt_client=mqtt_client,
-                    )
-                except Exception:
-                    logging.exception("Failed to refresh status; retrying after sleep")
-                if interval <= 0:
-                    break
-                print(f"Sleeping for {interval} seconds before next refresh")
-                time.sleep(interval)
+            loop.run_until_complete(
+                _refresh_forever(
+                    client,
+                    sl,
+                    pl,
+                    param_by_vid,
+                    mqtt_client,
+                    interval,
+                )
+            )
     except KeyboardInterrupt:
         print("Interrupted; stopping refresh loop.")
     finally:
-        if mqtt_client is not None and getattr(mqtt_client, "_wolf_persistent", False):
-            mqtt_client.loop_stop()
+        if mqtt_client is not None and mqtt_client._wolf_loop_started:
             mqtt_client.disconnect()
+            mqtt_client.loop_stop()
 
 
 if __name__ == "__main__":
@@ -1,2 +1,50 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+_written_digests = {}
+
+
 def bearer_header(token: str):
     return {"Authorization": "Bearer " + token}
+
+
+def json_dumps(data) -> bytes:
+    """Serialize data to compact JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def json_loads(payload: bytes):
+    """Parse JSON from bytes, using orjson when it is installed; raises ValueError."""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def write_bytes_atomic(path: Path, payload: bytes) -> bool:
+    """Replace path with payload via a temp file, skipping writes this process already made."""
+    digest = hashlib.blake2b(payload, digest_size=8).digest()
+    if _written_digests.get(path) == digest and path.exists():
+        return False
+    fh = tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False
+    )
+    tmp = Path(fh.name)
+    try:
+        with fh:
+            fh.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    _written_digests[path] = digest
+    return True
@@ -3,44 +3,102 @@ from __future__ import annotations
 import datetime
 import json
 import logging
+import time
 from pathlib import Path
+from types import MappingProxyType
 
 from httpx import AsyncClient
 
 from wolf_comm import constants
+from wolf_comm.helpers import json_dumps, write_bytes_atomic
 
-from lxml import html
+from lxml import etree, html
 import pkce
 import shortuuid
 
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:  # pragma: no cover
+    HTMLParser = None
+
 
 
 _LOGGER = logging.getLogger(__name__)
 _TOKEN_CACHE_FILE = Path.cwd() / ".wolf_comm_token_cache.json"
 
+# Authorize callback query; filled with (state, code_challenge) per login
+_AUTHORIZE_CALLBACK_QUERY = (
+    "/connect/authorize/callback?client_id=" + constants.AUTHENTICATION_CLIENT
+    + "&redirect_uri=" + constants.BASE_URL + "/signin-callback.html"
+    + "&response_type=code&scope=%s&state=%%s&code_challenge=%%s"
+    + "&code_challenge_method=S256&response_mode=query&lang=de-DE"
+)
+_LOGIN_PAGE_URL_TEMPLATE = (
+    constants.AUTHENTICATION_BASE_URL + "/Account/Login?ReturnUrl=" + constants.AUTHENTICATION_URL
+    + _AUTHORIZE_CALLBACK_QUERY % "openid%%2520profile api role"
+)
+_LOGIN_RETURN_URL_TEMPLATE = (
+    constants.AUTHENTICATION_URL + _AUTHORIZE_CALLBACK_QUERY % "openid profile api role"
+)
+_VERIFY_XPATH = etree.XPath("//form/input/@value")
+_VERIFY_SELECTOR = 'form input[name="__RequestVerificationToken"]'
+_LOGIN_URL = constants.AUTHENTICATION_BASE_URL + "/Account/Login"
+_TOKEN_URL = constants.AUTHENTICATION_BASE_URL + "/connect/token"
+_REDIRECT_URI = constants.BASE_URL + "/signin-callback.html"
+
+_LOGIN_HEADERS = MappingProxyType({
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+})
+_TOKEN_HEADERS = MappingProxyType({
+    "Cache-control": "no-cache",
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:108.0) Gecko/20100101 Firefox/108.0",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "de-DE,de;q=0.8,en-US;q=0.5,en;q=0.3",
+    "Referer": constants.BASE_URL + "/",
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "same-origin",
+    "TE": "trailers"
+})
+
+
+def _extract_verification_token(content: bytes) -> str | None:
+    """Return the login form's __RequestVerificationToken, preferring selectolax when installed."""
+    if HTMLParser is not None:
+        node = HTMLParser(content).css_first(_VERIFY_SELECTOR)
+        if node is not None and node.attributes.get("value"):
+            return node.attributes["value"]
+    elements = _VERIFY_XPATH(html.fromstring(content))
+    return elements[0] if elements else None
+
 
 class Tokens:
     """Has only one token: access"""
 
     def __init__(self, access_token: str, expires_in: int):
         self.access_token = access_token
-        self.expire_date = datetime.datetime.now() + datetime.timedelta(seconds=expires_in)
+        self.expire_ts = time.time() + expires_in
+
+    @property
+    def expire_date(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.expire_ts)
 
     def is_expired(self) -> bool:
-        return self.expire_date < datetime.datetime.now()
+        return self.expire_ts < time.time()
 
     def to_cache_entry(self) -> dict:
         return {
             "access_token": self.access_token,
-            "expire_date": self.expire_date.isoformat(),
+            "expire_ts": self.expire_ts,
         }
 
     @classmethod
     def from_cache_entry(cls, entry: dict) -> "Tokens":
-        expire_date = datetime.datetime.fromisoformat(entry["expire_date"])
+        expire_ts = float(entry["expire_ts"])
         instance = cls.__new__(cls)
         instance.access_token = entry["access_token"]
-        instance.expire_date = expire_date
+        instance.expire_ts = expire_ts
         return instance
 
 
@@ -55,7 +113,7 @@ class TokenAuth:
         cached = self._load_cached_tokens()
         if cached:
             if not cached.is_expired():
-                print("Using cached token for user %s", self.username)
+                _LOGGER.debug("Using cached token for user %s", self.username)
                 return cached
             _LOGGER.info("Cached token for user %s expired, requesting a new one", self.username)
         try:
@@ -65,18 +123,15 @@ class TokenAuth:
         
 
             # Retrieve verification token from WOLF website
-            r = await client.get(constants.AUTHENTICATION_BASE_URL + '/Account/Login?ReturnUrl=/idsrv/connect/authorize/callback?client_id={}&redirect_uri={}/signin-callback.html&response_type=code&scope=openid%2520profile api role&state={}&code_challenge={}&code_challenge_method=S256&response_mode=query&lang=de-DE'.format(constants.AUTHENTICATION_CLIENT, constants.BASE_URL,state, code_challenge))
+            r = await client.get(_LOGIN_PAGE_URL_TEMPLATE % (state, code_challenge))
 
             _LOGGER.debug('Verification code response: %s', r.content)
 
-            tree = html.document_fromstring(r.text)
-            elements = tree.xpath('//form/input/@value')
-
-            if elements:
+            verification_token = _extract_verification_token(r.content)
 
-                _LOGGER.debug('Verification token: %s', elements[0])
+            if verification_token:
 
-                verification_token = elements[0] # __RequestVerificationToken
+                _LOGGER.debug('Verification token: %s', verification_token)
 
                 # Get code
                 login_data = {
@@ -86,14 +141,11 @@ class TokenAuth:
                 }
 
                 r = await client.post(
-                    constants.AUTHENTICATION_BASE_URL + "/Account/Login",
+                    _LOGIN_URL,
                     params={
-                        "ReturnUrl": constants.AUTHENTICATION_URL + "/connect/authorize/callback?client_id={}&redirect_uri={}/signin-callback.html&response_type=code&scope=openid profile api role&state={}&code_challenge={}&code_challenge_method=S256&response_mode=query&lang=de-DE".format(constants.AUTHENTICATION_CLIENT, constants.BASE_URL, state,code_challenge)
-                    },
-                    headers={
-                        "Sec-Fetch-Dest": "document",
-                        "Sec-Fetch-Mode": "navigate",
+                        "ReturnUrl": _LOGIN_RETURN_URL_TEMPLATE % (state, code_challenge)
                     },
+                    headers=_LOGIN_HEADERS,
                     data=login_data,
                     cookies = r.cookies,
                     follow_redirects=True
@@ -101,28 +153,15 @@ class TokenAuth:
                 
                 _LOGGER.debug('Code response: %s', r.content)
                 code = r.url.params['code']
-                
-
-                headers = {
-                    "Cache-control": "no-cache",
-                    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:108.0) Gecko/20100101 Firefox/108.0",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                    "Accept-Language": "de-DE,de;q=0.8,en-US;q=0.5,en;q=0.3",
-                    "Referer": constants.BASE_URL + "/",
-                    "Sec-Fetch-Dest": "document",
-                    "Sec-Fetch-Mode": "navigate",
-                    "Sec-Fetch-Site": "same-origin",
-                    "TE": "trailers"
-                }
 
                 # Get token
                 r = await client.post(
-                    constants.AUTHENTICATION_BASE_URL + "/connect/token",
-                    headers=headers,
+                    _TOKEN_URL,
+                    headers=_TOKEN_HEADERS,
                     data={
                         "client_id": "smartset.web",
                         "code": code,
-                        "redirect_uri": constants.BASE_URL + "/signin-callback.html",
+                        "redirect_uri": _REDIRECT_URI,
                         "code_verifier": code_verifier,
                         "grant_type": "authorization_code",
                     },
@@ -149,7 +188,7 @@ class TokenAuth:
         if not entry:
             return None
         try:
-            print("Loaded cached token entry for %s", self.username)
+            _LOGGER.debug("Loaded cached token entry for %s", self.username)
             return Tokens.from_cache_entry(entry)
         except (KeyError, ValueError) as exc:
             _LOGGER.warning("Invalid cache entry for user %s: %s", self.username, exc)
@@ -159,16 +198,15 @@ class TokenAuth:
         cache = self._read_cache()
         cache[self.username] = tokens.to_cache_entry()
         try:
-            print("Saving cached token entry for %s", self.username)
-            _TOKEN_CACHE_FILE.write_text(json.dumps(cache), encoding="utf-8")
+            _LOGGER.debug("Saving cached token entry for %s", self.username)
+            write_bytes_atomic(_TOKEN_CACHE_FILE, json_dumps(cache))
         except OSError as exc:
             _LOGGER.warning("Failed to write token cache to %s: %s", _TOKEN_CACHE_FILE, exc)
 
     def _read_cache(self) -> dict:
         try:
-            raw = _TOKEN_CACHE_FILE.read_text(encoding="utf-8")
-            print("Read token cache file %s (size %d)", _TOKEN_CACHE_FILE, len(raw))
-            return json.loads(raw)
+            with _TOKEN_CACHE_FILE.open("rb", buffering=65536) as fh:
+                return json.load(fh)
         except FileNotFoundError:
             return {}
         except json.JSONDecodeError as exc:
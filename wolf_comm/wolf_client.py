@@ -76,7 +76,7 @@ class WolfClient:
             self.last_session_refesh = datetime.datetime.now() + datetime.timedelta(
                 seconds=60
             )
-            print("Session ID: %s extended", self.session_id)
+            _LOGGER.debug("Session ID: %s extended", self.session_id)
 
         if "json" in kwargs and self.session_id is not None:
             if isinstance(kwargs["json"], dict):
@@ -270,48 +270,51 @@ class WolfClient:
 
     # api/portal/GetParameterValues
     async def fetch_value(self, gateway_id, system_id, parameters: list[Parameter]):
-        values_combined = []
         bundles = {}
-        last_access_map = {}
-        
+
         for param in parameters:
             bundles.setdefault(param.bundle_id, []).append(param)
-            last_access_map.setdefault(param.bundle_id, None)
 
+        # Bundles are requested one after another: __request re-authorizes and
+        # replaces the session on 401/500, which is not safe to run concurrently.
+        values_combined = []
         for bundle_id, params in bundles.items():
             if not params:
                 continue
-                
-            data = {
-                BUNDLE_ID: bundle_id,
-                BUNDLE: False,
-                VALUE_ID_LIST: [param.value_id for param in params],  
-                GATEWAY_ID: gateway_id,
-                SYSTEM_ID: system_id,
-                GUI_ID_CHANGED: False,
-                SESSION_ID: self.session_id,
-                LAST_ACCESS: last_access_map[bundle_id],
-            }
-            
-            _LOGGER.debug('Requesting %s values for BUNDLE_ID: %s', len(params), bundle_id)
-            res = await self.__request("post", "api/portal/GetParameterValues", json=data, headers={"Content-Type": "application/json"})
-
-            if ERROR_CODE in res or ERROR_TYPE in res:
-                error_msg = f"Error {res.get(ERROR_CODE, '')}: {res.get(ERROR_MESSAGE, str(res))}"
-                if ERROR_MESSAGE in res and res[ERROR_MESSAGE] == ERROR_READ_PARAMETER:
-                    raise ParameterReadError(error_msg)
-                raise FetchFailed(error_msg)
-
             values_combined.extend(
-                Value(v[VALUE_ID], v[VALUE], v[STATE])
-                for v in res[VALUES]
-                if VALUE in v
+                await self.__fetch_bundle_values(gateway_id, system_id, bundle_id, params)
             )
-            last_access_map[bundle_id] = res[LAST_ACCESS]
 
         _LOGGER.debug('requested values for %s parameters, got values for %s ', len(parameters), len(values_combined))
         return values_combined
 
+    async def __fetch_bundle_values(self, gateway_id, system_id, bundle_id, params) -> list[Value]:
+        data = {
+            BUNDLE_ID: bundle_id,
+            BUNDLE: False,
+            VALUE_ID_LIST: [param.value_id for param in params],
+            GATEWAY_ID: gateway_id,
+            SYSTEM_ID: system_id,
+            GUI_ID_CHANGED: False,
+            SESSION_ID: self.session_id,
+            LAST_ACCESS: None,
+        }
+
+        _LOGGER.debug('Requesting %s values for BUNDLE_ID: %s', len(params), bundle_id)
+        res = await self.__request("post", "api/portal/GetParameterValues", json=data, headers={"Content-Type": "application/json"})
+
+        if ERROR_CODE in res or ERROR_TYPE in res:
+            error_msg = f"Error {res.get(ERROR_CODE, '')}: {res.get(ERROR_MESSAGE, str(res))}"
+            if ERROR_MESSAGE in res and res[ERROR_MESSAGE] == ERROR_READ_PARAMETER:
+                raise ParameterReadError(error_msg)
+            raise FetchFailed(error_msg)
+
+        return [
+            Value(v[VALUE_ID], v[VALUE], v[STATE])
+            for v in res[VALUES]
+            if VALUE in v
+        ]
+
     # api/portal/WriteParameterValues
     async def write_value(self, gateway_id, system_id, bundle_id, Value):
         data = {